@@ -90,6 +90,27 @@ else:
     }
 
 
+# Cache
+# Rate limit counters must be shared between workers, so use Redis when available
+
+REDIS_URL = config("REDIS_URL", default=None)
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    # Local development: per-process memory cache
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -131,5 +152,19 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 OPENWEATHER_API_KEY = config("OPENWEATHER_API_KEY")
+
+# Weather cache limits, enforced by `manage.py sweep_weather_cache`
+WEATHER_CACHE_MAX_ENTRIES = config("WEATHER_CACHE_MAX_ENTRIES", default=5000, cast=int)
+WEATHER_CACHE_MAX_AGE_HOURS = config(
+    "WEATHER_CACHE_MAX_AGE_HOURS", default=24, cast=int
+)
 LOGIN_REDIRECT_URL = "index"
 LOGOUT_REDIRECT_URL = "index"
+
+# Per-client rate limits for public weather endpoints (requests per window)
+RATELIMIT_ENABLED = config("RATELIMIT_ENABLED", default=True, cast=bool)
+RATELIMIT_WINDOW = config("RATELIMIT_WINDOW", default=60, cast=int)  # seconds
+RATELIMIT_REQUESTS = config("RATELIMIT_REQUESTS", default=60, cast=int)
+RATELIMIT_CACHE_MISSES = config("RATELIMIT_CACHE_MISSES", default=10, cast=int)
+# Number of trusted reverse proxies in front of the app (0 uses REMOTE_ADDR)
+RATELIMIT_PROXY_COUNT = config("RATELIMIT_PROXY_COUNT", default=0, cast=int)
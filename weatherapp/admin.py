@@ -13,7 +13,7 @@ class CityAdmin(admin.ModelAdmin):
 
 @admin.register(WeatherCache)
 class WeatherCacheAdmin(admin.ModelAdmin):
-    list_display = ("city_name", "updated_at")
+    list_display = ("city_name", "updated_at", "last_accessed_at", "hit_count")
     search_fields = ("city_name",)
     ordering = ("-updated_at",)
     readonly_fields = ("data", "forecast_data", "updated_at")
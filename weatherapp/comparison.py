@@ -0,0 +1,115 @@
+# weatherapp/comparison.py
+import numpy as np
+
+HOURLY_SLOTS = 8  # First 24 hours (8 x 3-hour intervals)
+HOURS_PER_SLOT = 3
+PERCENTILES = (10, 50, 90)
+
+
+def dedupe_rows(rows):
+    """
+    Keep one row per (city, country). Cache rows are keyed by the search text,
+    so "london" and "london,gb" both hold London; the first row seen wins.
+    """
+    seen = set()
+    unique = []
+    for row in rows:
+        data = row[1]
+        key = (data.get("city", row[0]), data.get("country"))
+        if key not in seen:
+            seen.add(key)
+            unique.append(row)
+    return unique
+
+
+def build_city_arrays(rows):
+    """Load cached weather rows into columnar arrays (one row per city)"""
+    count = len(rows)
+    names = []
+    temperature = np.full(count, np.nan)
+    wind_speed = np.full(count, np.nan)
+    humidity = np.full(count, np.nan)
+    aqi = np.full(count, np.nan)
+    hourly_temp = np.full((count, HOURLY_SLOTS), np.nan)
+    hourly_pop = np.full((count, HOURLY_SLOTS), np.nan)
+
+    for i, (city_name, data, hourly_data, air_quality_data) in enumerate(rows):
+        names.append(data.get("city", city_name))
+        temperature[i] = data.get("temperature", np.nan)
+        wind_speed[i] = data.get("wind_speed", np.nan)
+        humidity[i] = data.get("humidity", np.nan)
+        if air_quality_data:
+            aqi[i] = air_quality_data.get("aqi", np.nan)
+        hours = (hourly_data or [])[:HOURLY_SLOTS]
+        if hours:
+            hourly_temp[i, : len(hours)] = [h.get("temp", np.nan) for h in hours]
+            hourly_pop[i, : len(hours)] = [h.get("pop", np.nan) for h in hours]
+
+    return {
+        "names": np.array(names, dtype=object),
+        "temperature": temperature,
+        "wind_speed": wind_speed,
+        "humidity": humidity,
+        "aqi": aqi,
+        "hourly_temp": hourly_temp,
+        "hourly_pop": hourly_pop,
+    }
+
+
+def _rank(names, values, limit, descending=True):
+    """Top `limit` cities by value, ignoring cities without data"""
+    valid = np.flatnonzero(np.isfinite(values))
+    if not valid.size:
+        return []
+    order = np.argsort(-values[valid] if descending else values[valid], kind="stable")
+    top = valid[order[:limit]]
+    return [
+        {"city": name, "value": round(float(value), 1)}
+        for name, value in zip(names[top], values[top])
+    ]
+
+
+def _percentiles(values):
+    finite = values[np.isfinite(values)]
+    if not finite.size:
+        return None
+    return {
+        f"p{p}": round(float(v), 1)
+        for p, v in zip(PERCENTILES, np.percentile(finite, PERCENTILES))
+    }
+
+
+def compare_cities(arrays, limit=5, rain_threshold=50):
+    """Compute rankings, percentiles and threshold crossings across cities"""
+    names = arrays["names"]
+
+    # Hours until precipitation probability first reaches the threshold,
+    # counted to the end of that 3-hour slot (the first slot is 3 hours)
+    crossed = arrays["hourly_pop"] >= rain_threshold
+    hours_until_rain = np.where(
+        crossed.any(axis=1), (crossed.argmax(axis=1) + 1) * HOURS_PER_SLOT, np.nan
+    )
+
+    # fmax skips NaN padding and yields NaN only for cities without hourly data
+    peak_temp = np.fmax.reduce(arrays["hourly_temp"], axis=1)
+
+    return {
+        "cities": len(names),
+        "rankings": {
+            "hottest": _rank(names, arrays["temperature"], limit),
+            "coldest": _rank(names, arrays["temperature"], limit, descending=False),
+            "windiest": _rank(names, arrays["wind_speed"], limit),
+            "worst_aqi": _rank(names, arrays["aqi"], limit),
+            "hottest_next_24h": _rank(names, peak_temp, limit),
+            "rain_soonest": _rank(names, hours_until_rain, limit, descending=False),
+        },
+        "percentiles": {
+            "temperature": _percentiles(arrays["temperature"]),
+            "wind_speed": _percentiles(arrays["wind_speed"]),
+            "humidity": _percentiles(arrays["humidity"]),
+        },
+        "thresholds": {
+            "rain_threshold": rain_threshold,
+            "cities_with_rain_24h": int(np.isfinite(hours_until_rain).sum()),
+        },
+    }
@@ -0,0 +1,99 @@
+# weatherapp/management/commands/sweep_weather_cache.py
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from weatherapp.models import WeatherCache
+
+
+class Command(BaseCommand):
+    help = "Evict stale and excess WeatherCache rows in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-entries",
+            type=int,
+            default=settings.WEATHER_CACHE_MAX_ENTRIES,
+            help="Maximum number of cached cities to keep",
+        )
+        parser.add_argument(
+            "--max-age-hours",
+            type=int,
+            default=settings.WEATHER_CACHE_MAX_AGE_HOURS,
+            help="Evict entries not refreshed within this many hours",
+        )
+        parser.add_argument(
+            "--policy",
+            choices=["lru", "lfu"],
+            default="lru",
+            help="Eviction order once the cache is over its size cap",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Rows deleted per statement, to keep locks short",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Repeat the sweep every N seconds (0 runs once)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            # Drop connections that went stale while sleeping (conn_max_age)
+            close_old_connections()
+            try:
+                expired, evicted = self.sweep(**options)
+            except DatabaseError as e:
+                if not options["interval"]:
+                    raise
+                self.stderr.write(self.style.ERROR(f"Weather cache sweep failed: {e}"))
+            else:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Swept weather cache: {expired} expired, {evicted} evicted"
+                    )
+                )
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
+
+    def sweep(self, max_entries, max_age_hours, policy, batch_size, **options):
+        cutoff = timezone.now() - timedelta(hours=max_age_hours)
+        expired = self.delete_in_batches(
+            WeatherCache.objects.filter(updated_at__lt=cutoff), batch_size
+        )
+
+        evicted = 0
+        excess = WeatherCache.objects.count() - max_entries
+        if excess > 0:
+            last_accessed = F("last_accessed_at").asc(nulls_first=True)
+            if policy == "lfu":
+                ordering = ["hit_count", last_accessed, "updated_at"]
+            else:
+                ordering = [last_accessed, "hit_count", "updated_at"]
+            evicted = self.delete_in_batches(
+                WeatherCache.objects.order_by(*ordering), batch_size, limit=excess
+            )
+
+        return expired, evicted
+
+    def delete_in_batches(self, queryset, batch_size, limit=None):
+        """Delete rows by primary key in short, independent statements"""
+        deleted = 0
+        while limit is None or deleted < limit:
+            size = batch_size if limit is None else min(batch_size, limit - deleted)
+            ids = list(queryset.values_list("pk", flat=True)[:size])
+            if not ids:
+                break
+            count, _ = WeatherCache.objects.filter(pk__in=ids).delete()
+            deleted += count
+        return deleted
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weatherapp', '0002_weatheralert_city_is_default_city_latitude_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weathercache',
+            name='hit_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='weathercache',
+            name='last_accessed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='weathercache',
+            index=models.Index(fields=['updated_at'], name='weathercache_updated_idx'),
+        ),
+    ]
@@ -28,6 +28,15 @@ class WeatherCache(models.Model):
     hourly_data = models.JSONField(null=True, blank=True)  # New: hourly forecast
     air_quality_data = models.JSONField(null=True, blank=True)  # New: air quality
     updated_at = models.DateTimeField(auto_now=True)
+    last_accessed_at = models.DateTimeField(null=True, blank=True)  # For LRU eviction
+    hit_count = models.PositiveIntegerField(default=0)  # For LFU eviction
+
+    class Meta:
+        # last_accessed_at is written on every hit, so it is left unindexed
+        # to keep those updates HOT in Postgres
+        indexes = [
+            models.Index(fields=["updated_at"], name="weathercache_updated_idx"),
+        ]
 
     def __str__(self):
         return f"{self.city_name} - {self.updated_at}"
@@ -0,0 +1,128 @@
+# weatherapp/ratelimit.py
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+
+def get_client_ip(request):
+    """
+    Client IP. Behind RATELIMIT_PROXY_COUNT trusted proxies, take the
+    X-Forwarded-For entry the outermost one appended, counting from the
+    right; anything further left is client-supplied and can be forged.
+    """
+    proxy_count = settings.RATELIMIT_PROXY_COUNT
+    if proxy_count:
+        forwarded = [
+            entry.strip()
+            for entry in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")
+            if entry.strip()
+        ]
+        if len(forwarded) >= proxy_count:
+            return forwarded[-proxy_count]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def get_client_keys(request):
+    """Identities to count a request against: the IP and, if logged in, the user"""
+    keys = [f"ip:{get_client_ip(request)}"]
+    if request.user.is_authenticated:
+        keys.append(f"user:{request.user.pk}")
+    return keys
+
+
+def check_rates(limits, window):
+    """
+    Sliding window counters: weight the previous window's count by how much of
+    it still overlaps the sliding window. `limits` maps counter keys to their
+    budgets. A hit is recorded against every counter only if all of them have
+    room; returns seconds to wait, or 0 once the hit is recorded.
+    """
+    now = time.time()
+    current = int(now // window)
+    elapsed = now - current * window
+    weight = 1 - elapsed / window
+    retry_after = max(1, math.ceil(window - elapsed))
+
+    keys = {
+        key: (f"ratelimit:{key}:{current}", f"ratelimit:{key}:{current - 1}")
+        for key in limits
+    }
+    counts = cache.get_many([k for pair in keys.values() for k in pair])
+
+    def estimate(key, current_count):
+        return counts.get(keys[key][1], 0) * weight + current_count
+
+    # Check every budget before charging any of them
+    for key, limit in limits.items():
+        if estimate(key, counts.get(keys[key][0], 0)) >= limit:
+            return retry_after
+
+    # incr is atomic, so its result catches concurrent workers racing past
+    # the check above; undo this request's hits if any budget overshot
+    incremented = []
+    for key, limit in limits.items():
+        current_key = keys[key][0]
+        # Keep counters for two windows so the next one can still weight them
+        cache.add(current_key, 0, timeout=window * 2)
+        try:
+            count = cache.incr(current_key)
+        except ValueError:
+            cache.set(current_key, 1, timeout=window * 2)
+            count = 1
+        incremented.append(current_key)
+        if estimate(key, count - 1) >= limit:
+            for done in incremented:
+                try:
+                    cache.decr(done)
+                except ValueError:
+                    pass
+            return retry_after
+    return 0
+
+
+def rate_limit(scope, would_miss=None, json_response=False):
+    """
+    Throttle a view per client IP and per user. Requests for which
+    `would_miss(request)` is true also count against the stricter
+    cache-miss budget, since each one costs upstream API calls.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not settings.RATELIMIT_ENABLED:
+                return view_func(request, *args, **kwargs)
+
+            window = settings.RATELIMIT_WINDOW
+            budgets = [(scope, settings.RATELIMIT_REQUESTS)]
+            if would_miss and would_miss(request):
+                budgets.append((f"{scope}:miss", settings.RATELIMIT_CACHE_MISSES))
+
+            limits = {
+                f"{name}:{client}": limit
+                for name, limit in budgets
+                for client in get_client_keys(request)
+            }
+            retry_after = check_rates(limits, window)
+            if retry_after:
+                return too_many_requests(retry_after, json_response)
+
+            return view_func(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def too_many_requests(retry_after, json_response):
+    message = "Too many requests. Please try again later."
+    if json_response:
+        response = JsonResponse({"success": False, "error": message}, status=429)
+    else:
+        response = HttpResponse(message, status=429)
+    response["Retry-After"] = str(retry_after)
+    return response
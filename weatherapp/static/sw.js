@@ -1,28 +1,205 @@
-const CACHE_NAME = 'weatherapp-v1';
+const CACHE_VERSION = 'v2';
+const STATIC_CACHE = `weatherapp-static-${CACHE_VERSION}`;
+const CITY_CACHE = `weatherapp-cities-${CACHE_VERSION}`;
+const MAX_CITY_PAGES = 20;
+const SYNC_CACHE = `weatherapp-sync-${CACHE_VERSION}`;
+const SYNC_TAG = 'refresh-weather';
+const SYNC_QUEUE_KEY = '/__sw/sync-queue';
+const MAX_SYNC_REFRESHES = 5;
 const urlsToCache = [
   '/',
   '/static/manifest.json',
 ];
 
+// Normalised cache key for a city page, or null for other requests
+function cityKey(url) {
+  const city = url.searchParams.get('city');
+  if (url.pathname !== '/' || !city) {
+    return null;
+  }
+  return new URL(`/?city=${encodeURIComponent(city.trim().toLowerCase())}`, self.location.origin).href;
+}
+
+// Fresh while the server's cache entry behind this page is still valid
+function isFresh(response) {
+  const fetchedAt = Number(response.headers.get('X-SW-Fetched-At') || 0);
+  const maxAge = Number(response.headers.get('X-Weather-Max-Age') || 0);
+  return Date.now() - fetchedAt < maxAge * 1000;
+}
+
+async function stamp(response, maxAge) {
+  const headers = new Headers(response.headers);
+  headers.set('X-SW-Fetched-At', String(Date.now()));
+  if (maxAge) {
+    headers.set('X-Weather-Max-Age', maxAge);
+  }
+  return new Response(await response.blob(), {
+    status: response.status,
+    statusText: response.statusText,
+    headers,
+  });
+}
+
+// Keys are kept in refresh order, so the oldest entries are evicted first
+async function putCityPage(key, response) {
+  const cache = await caches.open(CITY_CACHE);
+  await cache.delete(key);
+  await cache.put(key, response);
+  const keys = await cache.keys();
+  await Promise.all(
+    keys.slice(0, Math.max(0, keys.length - MAX_CITY_PAGES)).map((request) => cache.delete(request))
+  );
+}
+
+async function revalidate(url, key, cached) {
+  const headers = new Headers();
+  const etag = cached && cached.headers.get('ETag');
+  if (etag) {
+    headers.set('If-None-Match', etag);
+  }
+  const response = await fetch(url, { headers, credentials: 'same-origin' });
+
+  if (response.status === 304 && cached) {
+    // Server cache entry unchanged: keep the page, extend its freshness
+    const refreshed = await stamp(cached.clone(), response.headers.get('X-Weather-Max-Age'));
+    await putCityPage(key, refreshed.clone());
+    return refreshed;
+  }
+  if (response.ok && response.headers.get('X-Weather-Version')) {
+    await putCityPage(key, await stamp(response.clone()));
+  }
+  return response;
+}
+
+// Keys whose revalidation failed, persisted so they survive SW restarts
+async function readSyncQueue() {
+  const response = await caches.match(SYNC_QUEUE_KEY, { cacheName: SYNC_CACHE });
+  return response ? response.json() : [];
+}
+
+async function writeSyncQueue(keys) {
+  const cache = await caches.open(SYNC_CACHE);
+  await cache.put(SYNC_QUEUE_KEY, new Response(JSON.stringify(keys)));
+}
+
+// Only the most recent failures are retried, to stay within the server's
+// cache-miss rate limit
+async function queueSync(key) {
+  const keys = (await readSyncQueue()).filter((queued) => queued !== key);
+  keys.push(key);
+  await writeSyncQueue(keys.slice(-MAX_SYNC_REFRESHES));
+  if (self.registration.sync) {
+    try {
+      await self.registration.sync.register(SYNC_TAG);
+    } catch (err) {
+      // Background Sync unavailable; the page falls back to the online event
+    }
+  }
+}
+
+async function staleWhileRevalidate(event, key) {
+  const cached = await caches.match(key, { cacheName: CITY_CACHE });
+  if (!cached) {
+    try {
+      return await revalidate(event.request.url, key, null);
+    } catch (err) {
+      await queueSync(key);
+      return (await caches.match('/', { cacheName: STATIC_CACHE })) || Response.error();
+    }
+  }
+  if (!isFresh(cached)) {
+    event.waitUntil(revalidate(event.request.url, key, cached).catch(() => queueSync(key)));
+  }
+  return cached;
+}
+
+async function networkFirst(request) {
+  try {
+    const response = await fetch(request);
+    if (response.ok && new URL(request.url).pathname === '/') {
+      const cache = await caches.open(STATIC_CACHE);
+      await cache.put('/', response.clone());
+    }
+    return response;
+  } catch (err) {
+    return (await caches.match('/', { cacheName: STATIC_CACHE })) || Response.error();
+  }
+}
+
+// Retry queued revalidations one at a time, e.g. after reconnecting. On a
+// network error or a 429/5xx the rest stay queued and the sync is retried.
+let refreshing = null;
+
+async function refreshQueued() {
+  let keys = await readSyncQueue();
+  while (keys.length) {
+    const key = keys[0];
+    const cached = await caches.match(key, { cacheName: CITY_CACHE });
+    const response = await revalidate(key, key, cached);
+    if (response.status === 429 || response.status >= 500) {
+      throw new Error(`Refresh of ${key} failed with ${response.status}`);
+    }
+    keys = keys.slice(1);
+    await writeSyncQueue(keys);
+  }
+}
+
+function refreshOnce() {
+  if (!refreshing) {
+    refreshing = refreshQueued().finally(() => {
+      refreshing = null;
+    });
+  }
+  return refreshing;
+}
+
 // Install event
 self.addEventListener('install', (event) => {
   event.waitUntil(
-    caches.open(CACHE_NAME)
+    caches.open(STATIC_CACHE)
       .then((cache) => cache.addAll(urlsToCache))
+      .then(() => self.skipWaiting())
   );
 });
 
 // Fetch event
 self.addEventListener('fetch', (event) => {
-  event.respondWith(
-    caches.match(event.request)
-      .then((response) => {
-        if (response) {
-          return response;
-        }
-        return fetch(event.request);
-      })
-  );
+  const { request } = event;
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin) {
+    return;
+  }
+
+  // Logins, logouts and favourite changes alter the rendered pages
+  if (request.method !== 'GET' || url.pathname === '/logout/') {
+    event.waitUntil(Promise.all([caches.delete(CITY_CACHE), caches.delete(SYNC_CACHE)]));
+    return;
+  }
+
+  const key = cityKey(url);
+  if (key) {
+    event.respondWith(staleWhileRevalidate(event, key));
+  } else if (request.mode === 'navigate') {
+    event.respondWith(networkFirst(request));
+  } else if (urlsToCache.includes(url.pathname)) {
+    event.respondWith(
+      caches.match(request).then((response) => response || fetch(request))
+    );
+  }
+});
+
+// Sync event
+self.addEventListener('sync', (event) => {
+  if (event.tag === SYNC_TAG) {
+    event.waitUntil(refreshOnce());
+  }
+});
+
+// Message event (reconnect fallback from the page)
+self.addEventListener('message', (event) => {
+  if (event.data === SYNC_TAG) {
+    event.waitUntil(refreshOnce());
+  }
 });
 
 // Activate event
@@ -31,11 +208,11 @@ self.addEventListener('activate', (event) => {
     caches.keys().then((cacheNames) => {
       return Promise.all(
         cacheNames.map((cacheName) => {
-          if (cacheName !== CACHE_NAME) {
+          if (![STATIC_CACHE, CITY_CACHE, SYNC_CACHE].includes(cacheName)) {
             return caches.delete(cacheName);
           }
         })
       );
-    })
+    }).then(() => self.clients.claim())
   );
-});
\ No newline at end of file
+});
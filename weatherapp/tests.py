@@ -1,3 +1,385 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .comparison import build_city_arrays, compare_cities, dedupe_rows
+from .management.commands.sweep_weather_cache import Command as SweepCommand
+from .models import City, WeatherCache
+from .ratelimit import get_client_ip, rate_limit
+
+
+def weather_row(city_name, city, temperature, wind_speed=None, hourly=None, aqi=None):
+    data = {"city": city, "country": "GB", "temperature": temperature}
+    if wind_speed is not None:
+        data["wind_speed"] = wind_speed
+    return (city_name, data, hourly, {"aqi": aqi} if aqi else None)
+
+
+class CompareCitiesTests(SimpleTestCase):
+    def test_empty_input(self):
+        results = compare_cities(build_city_arrays([]))
+
+        self.assertEqual(results["cities"], 0)
+        self.assertTrue(all(r == [] for r in results["rankings"].values()))
+        self.assertIsNone(results["percentiles"]["temperature"])
+        self.assertEqual(results["thresholds"]["cities_with_rain_24h"], 0)
+
+    def test_missing_data_is_skipped(self):
+        rows = [
+            weather_row(
+                "london",
+                "London",
+                12,
+                wind_speed=5,
+                hourly=[{"temp": 13, "pop": 10}, {"temp": 15, "pop": 70}],
+                aqi=3,
+            ),
+            weather_row("leeds", "Leeds", 9),
+            weather_row("york", "York", 20, wind_speed=2, hourly=[]),
+        ]
+
+        results = compare_cities(build_city_arrays(rows), rain_threshold=50)
+        rankings = results["rankings"]
+
+        self.assertEqual(results["cities"], 3)
+        self.assertEqual(
+            [r["city"] for r in rankings["hottest"]], ["York", "London", "Leeds"]
+        )
+        self.assertEqual([r["city"] for r in rankings["windiest"]], ["London", "York"])
+        self.assertEqual(rankings["worst_aqi"], [{"city": "London", "value": 3.0}])
+        self.assertEqual(
+            rankings["hottest_next_24h"], [{"city": "London", "value": 15.0}]
+        )
+        self.assertEqual(rankings["rain_soonest"], [{"city": "London", "value": 6.0}])
+        self.assertEqual(results["percentiles"]["wind_speed"]["p50"], 3.5)
+        self.assertEqual(results["thresholds"]["cities_with_rain_24h"], 1)
+
+    def test_limit(self):
+        rows = [weather_row(f"c{i}", f"C{i}", i) for i in range(10)]
+
+        results = compare_cities(build_city_arrays(rows), limit=2)
+
+        self.assertEqual(
+            [r["city"] for r in results["rankings"]["hottest"]], ["C9", "C8"]
+        )
+
+    def test_dedupe_rows(self):
+        rows = [
+            weather_row("london,gb", "London", 12),
+            weather_row("london", "London", 11),
+            weather_row("leeds", "Leeds", 9),
+        ]
+
+        self.assertEqual([row[0] for row in dedupe_rows(rows)], ["london,gb", "leeds"])
+
+
+class CompareCitiesViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for city_name, city, country, temperature in [
+            ("london", "London", "GB", 12),
+            ("london,gb", "London", "GB", 12),
+            ("leeds", "Leeds", "GB", 9),
+            ("paris", "Paris", "FR", 18),
+        ]:
+            WeatherCache.objects.create(
+                city_name=city_name,
+                data={"city": city, "country": country, "temperature": temperature},
+            )
+
+    def compare(self, **params):
+        return self.client.get("/api/compare/", params).json()
+
+    def test_city_names_with_unknown(self):
+        results = self.compare(cities="London, Paris,nowhere,london")
+
+        self.assertTrue(results["success"])
+        self.assertEqual(results["cities"], 2)
+        self.assertEqual(results["missing"], ["nowhere"])
+        self.assertEqual(results["rankings"]["hottest"][0]["city"], "Paris")
+
+    def test_country_filter_counts_each_city_once(self):
+        results = self.compare(country="gb")
+
+        self.assertEqual(results["cities"], 2)
+        self.assertEqual(
+            [r["city"] for r in results["rankings"]["hottest"]], ["London", "Leeds"]
+        )
+
+    def test_defaults_to_favourites(self):
+        user = User.objects.create_user("alice", password="secret")
+        City.objects.create(user=user, name="Leeds")
+        self.client.force_login(user)
+
+        results = self.compare()
+
+        self.assertEqual(results["cities"], 1)
+        self.assertEqual(results["rankings"]["hottest"][0]["city"], "Leeds")
+
+    def test_no_cities(self):
+        results = self.compare()
+
+        self.assertEqual(results, {"success": False, "error": "No cities to compare"})
+
+    def test_cap_reports_truncated_names(self):
+        with patch("weatherapp.views.MAX_COMPARE_CITIES", 2):
+            results = self.compare(cities="london,nowhere,paris")
+
+        self.assertEqual(results["cities"], 1)
+        self.assertEqual(results["missing"], ["nowhere"])
+        self.assertEqual(results["truncated"], ["paris"])
+
+    def test_invalid_parameters(self):
+        for params in [{"limit": "abc"}, {"rain_threshold": "1.5"}]:
+            results = self.compare(cities="london", **params)
+            self.assertEqual(results, {"success": False, "error": "Invalid parameters"})
+
+    def test_parameters_are_clamped(self):
+        results = self.compare(country="GB", limit="0", rain_threshold="500")
+
+        self.assertEqual(len(results["rankings"]["hottest"]), 1)
+        self.assertEqual(results["thresholds"]["rain_threshold"], 100)
+
+
+class SweepWeatherCacheTests(TestCase):
+    def cache_entry(self, city_name, hit_count=0, accessed_hours_ago=None):
+        last_accessed_at = None
+        if accessed_hours_ago is not None:
+            last_accessed_at = timezone.now() - timedelta(hours=accessed_hours_ago)
+        return WeatherCache.objects.create(
+            city_name=city_name,
+            data={},
+            hit_count=hit_count,
+            last_accessed_at=last_accessed_at,
+        )
+
+    def sweep(self, *args):
+        call_command("sweep_weather_cache", *args, stdout=StringIO())
+        return set(WeatherCache.objects.values_list("city_name", flat=True))
+
+    def test_expires_old_entries(self):
+        self.cache_entry("fresh")
+        old = self.cache_entry("old")
+        WeatherCache.objects.filter(pk=old.pk).update(
+            updated_at=timezone.now() - timedelta(hours=25)
+        )
+
+        self.assertEqual(self.sweep("--max-age-hours", "24"), {"fresh"})
+
+    def test_lru_evicts_least_recently_accessed(self):
+        self.cache_entry("never", hit_count=9)
+        self.cache_entry("old", hit_count=9, accessed_hours_ago=3)
+        self.cache_entry("recent", accessed_hours_ago=1)
+        self.cache_entry("now", accessed_hours_ago=0)
+
+        remaining = self.sweep("--max-entries", "2", "--policy", "lru")
+
+        self.assertEqual(remaining, {"recent", "now"})
+
+    def test_lfu_evicts_least_frequently_used(self):
+        self.cache_entry("cold", hit_count=1, accessed_hours_ago=0)
+        self.cache_entry("warm", hit_count=5, accessed_hours_ago=3)
+        self.cache_entry("hot", hit_count=9, accessed_hours_ago=3)
+
+        remaining = self.sweep("--max-entries", "2", "--policy", "lfu")
+
+        self.assertEqual(remaining, {"warm", "hot"})
+
+    def test_deletes_in_batches_up_to_limit(self):
+        for i in range(5):
+            self.cache_entry(f"city{i}", hit_count=i)
+
+        with CaptureQueriesContext(connection) as queries:
+            deleted = SweepCommand().delete_in_batches(
+                WeatherCache.objects.order_by("hit_count"), batch_size=2, limit=3
+            )
+
+        deletes = [q for q in queries if q["sql"].startswith("DELETE")]
+        self.assertEqual(deleted, 3)
+        self.assertEqual(len(deletes), 2)
+        self.assertEqual(
+            set(WeatherCache.objects.values_list("city_name", flat=True)),
+            {"city3", "city4"},
+        )
+
+
+@rate_limit("test", would_miss=lambda request: request.method == "POST")
+def limited_view(request):
+    return HttpResponse("ok")
+
+
+@override_settings(
+    RATELIMIT_ENABLED=True,
+    RATELIMIT_WINDOW=60,
+    RATELIMIT_REQUESTS=3,
+    RATELIMIT_CACHE_MISSES=1,
+    RATELIMIT_PROXY_COUNT=0,
+)
+class RateLimitTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        patcher = patch("weatherapp.ratelimit.time")
+        self.time = patcher.start().time
+        self.time.return_value = 6010.0  # 10s into a 60s window
+        self.addCleanup(patcher.stop)
+
+    def call(self, method="get", **extra):
+        request = getattr(self.factory, method)("/", **extra)
+        request.user = AnonymousUser()
+        return limited_view(request)
+
+    def test_429_with_retry_after_once_budget_exhausted(self):
+        for _ in range(3):
+            self.assertEqual(self.call().status_code, 200)
+
+        response = self.call()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "50")
+
+    def test_miss_budget_is_separate(self):
+        self.assertEqual(self.call("post").status_code, 200)
+        self.assertEqual(self.call("post").status_code, 429)
+
+        # Cache hits still have general budget left
+        self.assertEqual(self.call().status_code, 200)
+
+    def test_rejected_request_charges_no_budget(self):
+        self.call("post")
+        for _ in range(2):
+            self.assertEqual(self.call("post").status_code, 429)
+
+        # Only the one accepted miss used general budget
+        self.assertEqual(self.call().status_code, 200)
+        self.assertEqual(self.call().status_code, 200)
+        self.assertEqual(self.call().status_code, 429)
+
+    def test_concurrent_overshoot_is_rejected_and_undone(self):
+        for _ in range(3):
+            self.call()
+
+        # Another worker read the counters before these hits were recorded
+        with patch.object(cache, "get_many", return_value={}):
+            self.assertEqual(self.call().status_code, 429)
+
+        self.assertEqual(cache.get("ratelimit:test:ip:127.0.0.1:100"), 3)
+
+    def test_budgets_are_per_ip(self):
+        for _ in range(3):
+            self.call()
+
+        self.assertEqual(self.call().status_code, 429)
+        self.assertEqual(self.call(REMOTE_ADDR="10.0.0.2").status_code, 200)
+
+    def test_previous_window_is_weighted(self):
+        for _ in range(3):
+            self.call()
+
+        # Halfway through the next window, 3 old hits count as 1.5
+        self.time.return_value = 6090.0
+        self.assertEqual(self.call().status_code, 200)
+        self.assertEqual(self.call().status_code, 200)
+        self.assertEqual(self.call().status_code, 429)
+
+    @override_settings(RATELIMIT_PROXY_COUNT=1)
+    def test_client_ip_ignores_spoofed_forwarded_for(self):
+        request = self.factory.get(
+            "/", HTTP_X_FORWARDED_FOR="1.2.3.4, 203.0.113.7", REMOTE_ADDR="10.0.0.1"
+        )
+
+        self.assertEqual(get_client_ip(request), "203.0.113.7")
+
+    def test_client_ip_without_proxies(self):
+        request = self.factory.get(
+            "/", HTTP_X_FORWARDED_FOR="1.2.3.4", REMOTE_ADDR="10.0.0.1"
+        )
+
+        self.assertEqual(get_client_ip(request), "10.0.0.1")
+
+
+class CityPageCachingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        WeatherCache.objects.create(
+            city_name="london",
+            data={"city": "London", "country": "GB", "temperature": 12},
+            forecast_data=[],
+            hourly_data=[],
+        )
+        self.user = User.objects.create_user("alice", password="secret")
+
+    def test_search_uses_get(self):
+        response = self.client.get("/", {"city": "London"})
+
+        self.assertContains(response, "London, GB")
+        self.assertContains(response, '<form method="GET" class="mb-6">')
+
+    def test_post_search_still_works(self):
+        response = self.client.post("/", {"city": "London"})
+
+        self.assertContains(response, "London, GB")
+        self.assertNotIn("ETag", response)
+
+    def test_version_headers(self):
+        response = self.client.get("/", {"city": "London"})
+        version = WeatherCache.objects.get(city_name="london").updated_at
+
+        self.assertEqual(response["X-Weather-Version"], str(int(version.timestamp())))
+        self.assertTrue(0 < int(response["X-Weather-Max-Age"]) <= 30 * 60)
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+        self.assertTrue(response["ETag"].startswith('W/"'))
+
+    def test_not_modified_on_matching_etag(self):
+        etag = self.client.get("/", {"city": "London"})["ETag"]
+
+        response = self.client.get("/", {"city": "London"}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+
+    def test_etag_changes_with_favourites(self):
+        self.client.force_login(self.user)
+        etag = self.client.get("/", {"city": "London"})["ETag"]
+
+        City.objects.create(user=self.user, name="Paris")
+        response = self.client.get("/", {"city": "London"}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertContains(response, "Paris")
+
+    def test_pending_messages_skip_not_modified(self):
+        self.client.force_login(self.user)
+        etag = self.client.get("/", {"city": "London"})["ETag"]
+
+        # Leaves a flash message for the next page
+        self.client.post("/delete-city/999/")
+        response = self.client.get("/", {"city": "London"}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "City not found.")
+
+    def test_service_worker_served_from_root(self):
+        response = self.client.get("/sw.js")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/javascript")
+        self.assertEqual(response["Cache-Control"], "max-age=60")
+        self.assertIn(b"CACHE_VERSION", response.content)
+
+    def test_service_worker_missing(self):
+        with patch("weatherapp.views.finders.find", return_value=None):
+            response = self.client.get("/sw.js")
+
+        self.assertEqual(response.status_code, 404)
@@ -4,6 +4,7 @@ from . import views
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("sw.js", views.service_worker, name="service_worker"),
     path("dashboard/", views.dashboard, name="dashboard"),
     path("add-city/", views.add_city, name="add_city"),
     path("delete-city/<int:city_id>/", views.delete_city, name="delete_city"),
@@ -11,4 +12,5 @@ urlpatterns = [
     path("login/", views.login_view, name="login"),
     path("logout/", views.logout_view, name="logout"),
     path("api/location-weather/", views.get_location_weather, name="location_weather"),
+    path("api/compare/", views.compare_cities_weather, name="compare_cities"),
 ]
@@ -1,5 +1,5 @@
 # weatherapp/views.py
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseNotModified, JsonResponse
 import requests
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
@@ -8,10 +8,16 @@ from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib import messages
 from django.utils import timezone
 from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.db.models import Count, F, Max
 from datetime import timedelta, datetime
 from .models import City, WeatherCache
+from .comparison import build_city_arrays, compare_cities, dedupe_rows
+from .ratelimit import rate_limit
 
 API_KEY = settings.OPENWEATHER_API_KEY
+CACHE_TTL = timedelta(minutes=30)
+MAX_COMPARE_CITIES = 500
 
 
 def get_air_quality(lat, lon):
@@ -43,25 +49,45 @@ def get_air_quality(lat, lon):
     return None
 
 
-def get_weather_data(city_name, use_cache=True, lat=None, lon=None):
-    """Fetch comprehensive weather data with caching (30 minutes)"""
+def get_fresh_cache(city_name):
+    """Return the cache entry for a city if it is still fresh, or None"""
+    return WeatherCache.objects.filter(
+        city_name=city_name.lower(),
+        updated_at__gte=timezone.now() - CACHE_TTL,
+    ).first()
+
+
+def get_request_cache(request, city_name):
+    """Fresh cache entry for the requested city, looked up once per request"""
+    if not hasattr(request, "weather_cache"):
+        request.weather_cache = get_fresh_cache(city_name)
+    return request.weather_cache
+
+
+def get_weather_data(city_name, use_cache=True, lat=None, lon=None, cache=None):
+    """Fetch comprehensive weather data with caching (30 minutes)
+
+    `cache` is a fresh cache entry the caller has already looked up.
+    """
     if use_cache and city_name:
-        try:
-            cache = WeatherCache.objects.get(city_name=city_name.lower())
-            if timezone.now() - cache.updated_at < timedelta(minutes=30):
-                return (
-                    cache.data,
-                    cache.forecast_data,
-                    cache.hourly_data if hasattr(cache, "hourly_data") else None,
-                    (
-                        cache.air_quality_data
-                        if hasattr(cache, "air_quality_data")
-                        else None
-                    ),
-                    None,
-                )
-        except WeatherCache.DoesNotExist:
-            pass
+        if cache is None:
+            cache = get_fresh_cache(city_name)
+        if cache:
+            # Track access for the cache sweeper's LRU/LFU eviction
+            WeatherCache.objects.filter(pk=cache.pk).update(
+                last_accessed_at=timezone.now(), hit_count=F("hit_count") + 1
+            )
+            return (
+                cache.data,
+                cache.forecast_data,
+                cache.hourly_data if hasattr(cache, "hourly_data") else None,
+                (
+                    cache.air_quality_data
+                    if hasattr(cache, "air_quality_data")
+                    else None
+                ),
+                None,
+            )
 
     # Build URLs based on city name or coordinates
     if lat and lon:
@@ -180,6 +206,7 @@ def get_weather_data(city_name, use_cache=True, lat=None, lon=None):
                         "forecast_data": processed_forecast,
                         "hourly_data": hourly_forecasts,
                         "air_quality_data": air_quality,
+                        "last_accessed_at": timezone.now(),
                     },
                 )
 
@@ -190,6 +217,59 @@ def get_weather_data(city_name, use_cache=True, lat=None, lon=None):
         return None, None, None, None, f"Error fetching weather data: {str(e)}"
 
 
+def get_cache_version(city_name):
+    """Return the updated_at of a fresh cache entry, or None"""
+    return (
+        WeatherCache.objects.filter(
+            city_name=city_name.lower(),
+            updated_at__gte=timezone.now() - CACHE_TTL,
+        )
+        .values_list("updated_at", flat=True)
+        .first()
+    )
+
+
+def get_favourites_state(request):
+    """Count and newest added_at of the user's cities, for the page validator"""
+    if not request.user.is_authenticated:
+        return "0-0"
+    state = City.objects.filter(user=request.user).aggregate(
+        count=Count("id"), latest=Max("added_at")
+    )
+    latest = int(state["latest"].timestamp()) if state["latest"] else 0
+    return f"{state['count']}-{latest}"
+
+
+def get_cache_version_headers(request, version):
+    """Headers exposing the cache entry version so the service worker can revalidate"""
+    # The page also renders the favourites sidebar, so it is part of the ETag
+    return {
+        "ETag": (
+            f'W/"{int(version.timestamp())}-{request.user.pk or 0}'
+            f'-{get_favourites_state(request)}"'
+        ),
+        "X-Weather-Version": str(int(version.timestamp())),
+        "X-Weather-Max-Age": str(
+            max(0, int((version + CACHE_TTL - timezone.now()).total_seconds()))
+        ),
+        "Cache-Control": "private, no-cache",
+    }
+
+
+def index_would_miss(request):
+    """Whether an index request would fetch from the upstream API"""
+    if request.method == "POST":
+        city = request.POST.get("city")
+    else:
+        city = request.GET.get("city")
+    return bool(city) and get_request_cache(request, city) is None
+
+
+def is_post(request):
+    return request.method == "POST"
+
+
+@rate_limit("index", would_miss=index_would_miss)
 def index(request):
     """Main homepage view"""
     weather_data = None
@@ -204,12 +284,27 @@ def index(request):
 
     if request.method == "POST":
         city = request.POST.get("city")
-        if city:
-            weather_data, forecast_data, hourly_data, air_quality, error_message = (
-                get_weather_data(city)
-            )
-
-    return render(
+    else:
+        city = request.GET.get("city")
+
+    cache_entry = get_request_cache(request, city) if city else None
+    version_headers = None
+
+    # Let the service worker revalidate cached city pages cheaply, unless
+    # there are flash messages the cached copy would not show
+    if cache_entry and request.method == "GET":
+        version_headers = get_cache_version_headers(request, cache_entry.updated_at)
+        if not messages.get_messages(request) and (
+            request.headers.get("If-None-Match") == version_headers["ETag"]
+        ):
+            return HttpResponseNotModified(headers=version_headers)
+
+    if city:
+        weather_data, forecast_data, hourly_data, air_quality, error_message = (
+            get_weather_data(city, use_cache=cache_entry is not None, cache=cache_entry)
+        )
+
+    response = render(
         request,
         "weatherapp/index.html",
         {
@@ -221,8 +316,30 @@ def index(request):
             "user_cities": user_cities,
         },
     )
-
-
+    if weather_data and request.method == "GET":
+        if version_headers is None:
+            # Freshly fetched, so read back the version just written
+            version = get_cache_version(city)
+            if version:
+                version_headers = get_cache_version_headers(request, version)
+        for name, value in (version_headers or {}).items():
+            response[name] = value
+    return response
+
+
+def service_worker(request):
+    """Serve the service worker from the site root so it controls every page"""
+    path = finders.find("sw.js")
+    if not path:
+        raise Http404("Service worker not found")
+    with open(path) as f:
+        response = HttpResponse(f.read(), content_type="application/javascript")
+    # Keep this short so browsers pick up service worker updates quickly
+    response["Cache-Control"] = "max-age=60"
+    return response
+
+
+@rate_limit("location_weather", would_miss=is_post, json_response=True)
 def get_location_weather(request):
     """API endpoint for geolocation-based weather"""
     if request.method == "POST":
@@ -260,7 +377,69 @@ def get_location_weather(request):
     return JsonResponse({"success": False, "error": "Invalid request"})
 
 
+@rate_limit("compare", json_response=True)
+def compare_cities_weather(request):
+    """API endpoint comparing cached weather across many cities"""
+    city_names = [
+        name.strip().lower()
+        for name in request.GET.get("cities", "").split(",")
+        if name.strip()
+    ]
+    country = request.GET.get("country", "").strip().upper()
+
+    # Default to the user's favourite cities
+    if not city_names and not country and request.user.is_authenticated:
+        city_names = [
+            name.lower()
+            for name in City.objects.filter(user=request.user).values_list(
+                "name", flat=True
+            )
+        ]
+
+    if not city_names and not country:
+        return JsonResponse({"success": False, "error": "No cities to compare"})
+
+    # Drop repeated names, then cap how many we look up
+    city_names = list(dict.fromkeys(city_names))
+    truncated = city_names[MAX_COMPARE_CITIES:]
+    city_names = city_names[:MAX_COMPARE_CITIES]
+
+    try:
+        limit = max(1, min(int(request.GET.get("limit", 5)), 50))
+        rain_threshold = max(0, min(int(request.GET.get("rain_threshold", 50)), 100))
+    except ValueError:
+        return JsonResponse({"success": False, "error": "Invalid parameters"})
+
+    # Only compare fresh cached data; never call the upstream API here
+    rows = WeatherCache.objects.filter(updated_at__gte=timezone.now() - CACHE_TTL)
+    if city_names:
+        rows = rows.filter(city_name__in=city_names)
+    if country:
+        rows = rows.filter(data__country=country)
+    rows = list(
+        rows.order_by("-updated_at").values_list(
+            "city_name", "data", "hourly_data", "air_quality_data"
+        )[:MAX_COMPARE_CITIES]
+    )
+
+    found = {row[0] for row in rows}
+    results = compare_cities(
+        build_city_arrays(dedupe_rows(rows)),
+        limit=limit,
+        rain_threshold=rain_threshold,
+    )
+    return JsonResponse(
+        {
+            "success": True,
+            "missing": [name for name in city_names if name not in found],
+            "truncated": truncated,
+            **results,
+        }
+    )
+
+
 @login_required
+@rate_limit("add_city", would_miss=is_post)
 def add_city(request):
     if request.method == "POST":
         city_name = request.POST.get("city_name")